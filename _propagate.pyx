@@ -0,0 +1,117 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False
+"""
+Compiled arc-consistency propagation over bitmask domains.
+
+Same data layout as the numba kernels in inference_numba.py: cells are the
+board's linear indices r * N + c, 'domains' is a 1-D buffer of int64
+bitmasks, and the constraint graph is passed as the flat ACTables buffers
+(neighbor list + offsets, N*N x N*N inequality table). Any buffer works:
+array.array('q') / array.array('b') or NumPy int64 / int8 arrays.
+
+Build in place with:  python setup.py build_ext --inplace
+"""
+from libc.stdlib cimport malloc, calloc, free
+
+# Relation codes stored in the inequality table: "xi op xj"
+cdef enum:
+    OP_LESS = 1
+    OP_GREATER = 2
+
+
+cdef inline bint _revise(long long[::1] domains, Py_ssize_t xi, Py_ssize_t xj,
+                         const signed char[::1] ineq_table, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t ncells = n * n
+    cdef signed char op = ineq_table[xi * ncells + xj]
+    cdef bint same_line = (xi // n == xj // n) or (xi % n == xj % n)
+    cdef long long di = domains[xi]
+    cdef long long dj = domains[xj]
+    cdef long long rest = di
+    cdef long long keep = 0
+    cdef long long bit
+    cdef bint supported
+
+    while rest:
+        bit = rest & -rest  # Lowest remaining value
+        rest ^= bit
+        if op == OP_LESS:  # some y > x is needed
+            supported = (dj & ~((bit << 1) - 1)) != 0
+        elif op == OP_GREATER:  # some y < x is needed
+            supported = (dj & (bit - 1)) != 0
+        elif same_line:  # All-Different: some y != x is needed
+            supported = (dj & ~bit) != 0
+        else:
+            supported = True
+        if supported:
+            keep |= bit
+
+    if keep != di:
+        domains[xi] = keep
+        return True
+    return False
+
+
+cdef bint _drain(long long[::1] domains, long long *queue, unsigned char *in_queue,
+                 Py_ssize_t size, const long long[::1] neighbors_flat,
+                 const long long[::1] neighbors_offsets, const signed char[::1] ineq_table,
+                 Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t ncells = n * n
+    cdef Py_ssize_t capacity = ncells * ncells
+    cdef Py_ssize_t head = 0
+    cdef Py_ssize_t arc, next_arc, xi, xj, xk, k
+
+    while size > 0:
+        arc = queue[head]
+        head = (head + 1) % capacity
+        size -= 1
+        in_queue[arc] = 0
+
+        xi = arc // ncells
+        xj = arc % ncells
+        if _revise(domains, xi, xj, ineq_table, n):
+            if domains[xi] == 0:
+                return False
+            for k in range(neighbors_offsets[xi], neighbors_offsets[xi + 1]):
+                xk = neighbors_flat[k]
+                if xk != xj:
+                    next_arc = xk * ncells + xi
+                    if not in_queue[next_arc]:
+                        in_queue[next_arc] = 1
+                        queue[(head + size) % capacity] = next_arc
+                        size += 1
+    return True
+
+
+def ac3_propagate(long long[::1] domains, const long long[::1] neighbors_flat,
+                  const long long[::1] neighbors_offsets,
+                  const signed char[::1] ineq_table, Py_ssize_t n):
+    """
+    Runs AC-3 over 'domains' in place, starting from every arc of the graph.
+    Returns False as soon as a domain becomes empty, True otherwise.
+    """
+    cdef Py_ssize_t ncells = n * n
+    cdef Py_ssize_t capacity = ncells * ncells
+    cdef long long *queue = <long long *> malloc(capacity * sizeof(long long))
+    cdef unsigned char *in_queue = <unsigned char *> calloc(capacity, sizeof(unsigned char))
+    cdef Py_ssize_t size = 0
+    cdef Py_ssize_t xi, k, arc
+    cdef bint consistent
+
+    if queue == NULL or in_queue == NULL:
+        free(queue)
+        free(in_queue)
+        raise MemoryError()
+
+    for xi in range(ncells):
+        for k in range(neighbors_offsets[xi], neighbors_offsets[xi + 1]):
+            arc = xi * ncells + neighbors_flat[k]
+            queue[size] = arc
+            in_queue[arc] = 1
+            size += 1
+
+    with nogil:
+        consistent = _drain(domains, queue, in_queue, size, neighbors_flat,
+                            neighbors_offsets, ineq_table, n)
+
+    free(queue)
+    free(in_queue)
+    return consistent
@@ -0,0 +1,57 @@
+"""
+Flat constraint tables shared by the compiled arc-consistency propagators
+(the numba kernels in inference_numba.py and the _propagate Cython extension).
+
+Cells are the board's linear indices r * N + c. The neighbor lists are
+flattened into one buffer plus per-cell offsets, and the inequality
+relation "xi op xj" is stored in an N*N x N*N table of OP_* codes.
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Relation codes stored in the inequality table: "xi op xj"
+OP_NONE = 0
+OP_LESS = 1
+OP_GREATER = 2
+
+
+class ACTables:
+    """
+    Flat view of a board's constraint graph for the compiled kernels: NumPy
+    arrays when NumPy is installed, stdlib arrays otherwise (the Cython
+    extension only needs the buffer protocol).
+    """
+
+    def __init__(self, board):
+        n = board.size
+        ncells = n * n
+        self.size = n
+
+        neighbors_flat = []
+        neighbors_offsets = [0]
+        arcs = []
+        for var in range(ncells):
+            for neighbor in board.get_neighbors(var):
+                neighbors_flat.append(neighbor)
+                arcs.append(var * ncells + neighbor)
+            neighbors_offsets.append(len(neighbors_flat))
+
+        ineq_table = [OP_NONE] * (ncells * ncells)
+        for v1 in range(ncells):
+            for v2, op in board.ineq_between[v1].items():
+                ineq_table[v1 * ncells + v2] = OP_LESS if op == '<' else OP_GREATER
+
+        if np is not None:
+            self.neighbors_flat = np.array(neighbors_flat, dtype=np.int64)
+            self.neighbors_offsets = np.array(neighbors_offsets, dtype=np.int64)
+            self.ineq_table = np.array(ineq_table, dtype=np.int8)
+            self.initial_arcs = np.array(arcs, dtype=np.int64)
+        else:
+            self.neighbors_flat = array('q', neighbors_flat)
+            self.neighbors_offsets = array('q', neighbors_offsets)
+            self.ineq_table = array('b', ineq_table)
+            self.initial_arcs = array('q', arcs)
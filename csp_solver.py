@@ -1,90 +1,242 @@
+import os
+import queue
 import time
+import traceback
 from collections import deque
-from futoshiki_board import FutoshikiBoard
+from multiprocessing import Process, Queue, SimpleQueue
+from futoshiki_board import FutoshikiBoard, iter_bits
 from heuristics import select_unassigned_variable_mrv, order_domain_values_lcv
-from inference import forward_check, ac2
+from inference import CYTHON_AVAILABLE, forward_check, ac3
+from inference_numba import NUMBA_AVAILABLE, warmup
+from ac_tables import ACTables
+from specialize import line_scans
+
+
+def _solve_branch(solver, root_var, value):
+    """
+    Searches the subtree where 'root_var' takes 'value'.
+    Returns (solved, grid, backtracks); the solver's board is restored on failure
+    so it can take the next branch.
+    """
+    solver.backtracks = 0
+    mark = len(solver.trail)
+    if solver._assign_and_infer(root_var, value):
+        if solver._backtracking_search():
+            return True, list(solver.board.grid), solver.backtracks
+        solver._undo_assignment(root_var, mark)
+    return False, None, solver.backtracks + 1
+
+
+def _branch_worker(solver, root_var, tasks, results):
+    """
+    Worker process: solves root values from 'tasks' until the None sentinel.
+    A failure is reported on 'results' as its traceback text.
+    """
+    try:
+        for value in iter(tasks.get, None):
+            results.put(_solve_branch(solver, root_var, value))
+    except BaseException:
+        results.put(traceback.format_exc())
+
+
+def _next_result(results, workers):
+    """Waits for the next branch result; raises RuntimeError if a worker failed or died."""
+    while True:
+        try:
+            result = results.get(timeout=0.1)
+        except queue.Empty:
+            if any(worker.exitcode not in (None, 0) for worker in workers):
+                raise RuntimeError("A parallel search worker died before reporting its branch")
+            continue
+        if isinstance(result, str):
+            raise RuntimeError(f"A parallel search worker failed:\n{result}")
+        return result
 
 
 class CSPSolver:
-    def __init__(self, board, use_forward_checking=False, use_ac2=False, use_mrv=False, use_lcv=False):
+    def __init__(self, board, use_forward_checking=False, use_ac3=False, use_mrv=False, use_lcv=False,
+                 use_parallel=False, workers=None):
         self.board = board
         self.use_forward_checking = use_forward_checking
-        self.use_ac2 = use_ac2
+        self.use_ac3 = use_ac3
         self.use_mrv = use_mrv
         self.use_lcv = use_lcv
+        # Parallel search splits the values of the first variable across worker processes
+        self.use_parallel = use_parallel
+        self.workers = workers or os.cpu_count() or 1
         self.backtracks = 0
         self.start_time = 0
+        # Trail of (var, old_mask) entries for every domain change; each open search
+        # node remembers the trail length it started at and backtracking undoes back to it.
+        self.trail = []
+
+        # Flat constraint tables for the compiled AC propagators (Cython extension
+        # or numba kernel). For numba, the warmup call moves JIT compilation (or
+        # the cache load) out of the timed solve; the Cython build needs none.
+        self.ac_tables = None
+        if use_ac3 and (CYTHON_AVAILABLE or NUMBA_AVAILABLE):
+            self.ac_tables = ACTables(board)
+            if not CYTHON_AVAILABLE:
+                warmup()
+
+        # Only MRV reads the domain-size buckets, so the board maintains them only then
+        if use_mrv:
+            board.track_domain_sizes()
+
+        # Generate the row/column scans specialized for this board size up front
+        line_scans(board.size)
 
     def solve(self):
         self.backtracks = 0
         self.start_time = time.time()
-
-        # Pre-processing with AC-2 if enabled
-        if self.use_ac2:
-            print("Running initial AC-2 preprocessing...")
-            if not ac2(self):
-                print("Initial AC-2 detected inconsistency. No solution.")
+        self.trail = []
+
+        # is_consistent only checks constraints touching the cell being assigned,
+        # so the fixed cells are validated against each other once up front.
+        if not self.board.givens_consistent():
+            print("Initial board violates a constraint. No solution.")
+            return False
+
+        # Pre-processing with AC-3 if enabled
+        if self.use_ac3:
+            print("Running initial AC-3 preprocessing...")
+            if not ac3(self):
+                print("Initial AC-3 detected inconsistency. No solution.")
                 return False
 
-        solution_found = self._backtracking_search()
+        if self.use_parallel:
+            solution_found = self._parallel_search()
+        else:
+            solution_found = self._backtracking_search()
         end_time = time.time()
         print(f"\nSolver finished in {end_time - self.start_time:.4f} seconds.")
         print(f"Total backtracks: {self.backtracks}")
         return solution_found
 
-    def _backtracking_search(self):
-        # Check if the assignment is complete
-        if not self.board.get_unassigned_variables():
+    def _parallel_search(self):
+        """
+        Races one subtree per value of the root variable across worker processes;
+        the first solution found wins. Falls back to the sequential search when
+        there is nothing to split.
+        """
+        var = self._select_variable()
+        if var is None:
             return True
-
-        # Variable selection
+        domain_values = self._order_values(var)
+        processes = min(len(domain_values), self.workers)
+        if processes <= 1:
+            return self._backtracking_search()
+
+        # Queue every root value and one stop sentinel per worker up front
+        tasks = SimpleQueue()
+        results = Queue()
+        for value in domain_values:
+            tasks.put(value)
+        for _ in range(processes):
+            tasks.put(None)
+
+        workers = [Process(target=_branch_worker, args=(self, var, tasks, results))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in domain_values:
+                solved, grid, backtracks = _next_result(results, workers)
+                self.backtracks += backtracks
+                if solved:
+                    for cell, value in enumerate(grid):
+                        if self.board.grid[cell] == 0:
+                            self.board.assign(cell, value, self.trail)
+                    return True
+            return False
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+
+    def _select_variable(self):
+        """Returns the next variable to branch on, or None once every cell is assigned."""
         if self.use_mrv:
-            var = select_unassigned_variable_mrv(self)
-        else:
-            var = self.board.get_unassigned_variables()[0]  # Simple sequential selection
+            return select_unassigned_variable_mrv(self)
+        unassigned = self.board.get_unassigned_variables()
+        return unassigned[0] if unassigned else None  # Simple sequential selection
 
-        # Value ordering
+    def _order_values(self, var):
         if self.use_lcv:
-            domain_values = order_domain_values_lcv(var, self)
+            return order_domain_values_lcv(var, self)
+        return list(iter_bits(self.board.domains[var]))
+
+    def _assign_and_infer(self, var, value):
+        """
+        Places 'value' in 'var' if it is consistent and runs the enabled inference
+        on top of it. Returns True if the search can continue below this node, in
+        which case the caller later backtracks with _undo_assignment to the trail
+        length from before the call; otherwise the board is left exactly as it was.
+        """
+        # Remember where the trail stood so only the domains changed below get restored
+        mark = len(self.trail)
+
+        if self.use_forward_checking:
+            # Consistency check, assignment and neighbor pruning in a single pass
+            pruned = self.board.assign_and_propagate(var, value, self.trail)
+            if pruned is False:
+                return False
+            # Cascade naked/hidden singles; prunings are recorded on the trail
+            consistent = forward_check(self, var, pruned)
         else:
-            domain_values = list(self.board.domains[var])  # Get a copy to iterate
+            if not self.board.is_consistent(var, value):
+                return False
+            self.board.assign(var, value, self.trail)
+            consistent = True
 
-        # Try each value in the ordered domain
-        for value in domain_values:
-            # Check initial consistency (before assignment for fixed values or potential future checks)
-            # This is implicitly handled by domain pruning and `_is_consistent` for direct constraints.
-
-            # Make a deep copy of the current domains for backtracking
-            original_domains_copy = {v: set(d) for v, d in self.board.domains.items()}
-            original_grid_value = self.board.grid[var[0]][var[1]]  # Should be 0 for unassigned
-
-            self.board.assign(var, value)
-
-            if self.board.is_consistent(var, value):  # Check all types of constraints
-                pruned = {}
-                is_consistent_after_inference = True
-
-                if self.use_forward_checking:
-                    # Forward Checking returns pruned values if successful, or False if inconsistency
-                    fc_result = forward_check(self, var, value)
-                    if fc_result is False:
-                        is_consistent_after_inference = False
-                    else:
-                        pruned = fc_result  # Store pruned values for restoration
-
-                if is_consistent_after_inference and self.use_ac2:
-                    # Run AC-2 after assignment and FC (if AC-2 is also enabled)
-                    # AC-2 modifies domains directly, so we need to copy domains before it.
-                    if not ac2(self):
-                        is_consistent_after_inference = False
-
-                if is_consistent_after_inference:
-                    if self._backtracking_search():
-                        return True
-
-            # Backtrack: Restore the state
-            self.backtracks += 1
-            self.board.unassign(var)  # Resets grid value to 0 and initial domain set for 'var'
-            self.board.domains = original_domains_copy  # Restore all domains to state before current assignment
-
-        return False  # No value worked for this variable
\ No newline at end of file
+        # Run AC-3 after assignment and FC (if AC-3 is also enabled)
+        # AC-3 records its revisions on the trail as well.
+        if consistent and self.use_ac3:
+            consistent = ac3(self)
+
+        if consistent:
+            return True
+        self.board.unassign(var)
+        self.board.undo(self.trail, mark)
+        return False
+
+    def _undo_assignment(self, var, mark):
+        self.board.unassign(var)  # Resets grid value to 0
+        self.board.undo(self.trail, mark)  # Restore every domain changed since the mark
+
+    def _backtracking_search(self):
+        """
+        Depth-first search driven by an explicit stack instead of recursion.
+        Each frame is (var, iterator over its ordered values, trail mark), the
+        mark being the trail length before any value of var was placed. When a
+        frame runs out of values it is popped and the value its parent placed is
+        undone back to the parent's mark.
+        """
+        var = self._select_variable()
+        if var is None:
+            return True  # The assignment is already complete
+        stack = [(var, iter(self._order_values(var)), len(self.trail))]
+
+        while stack:
+            var, values, mark = stack[-1]
+            for value in values:
+                if self._assign_and_infer(var, value):
+                    break
+                # Backtrack: this value is inconsistent
+                self.backtracks += 1
+            else:
+                # No value worked for this variable: return to the parent frame
+                stack.pop()
+                if stack:
+                    parent_var, _, parent_mark = stack[-1]
+                    self._undo_assignment(parent_var, parent_mark)
+                    # Backtrack: the parent's value did not lead to a solution
+                    self.backtracks += 1
+                continue
+
+            var = self._select_variable()
+            if var is None:
+                return True  # Every cell is assigned
+            stack.append((var, iter(self._order_values(var)), len(self.trail)))
+
+        return False
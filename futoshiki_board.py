@@ -1,128 +1,300 @@
+def iter_bits(mask):
+    """Yields the values contained in a bitmask domain, in ascending order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
 class FutoshikiBoard:
+    """
+    Cells are identified internally by the integer index r * size + c; grid,
+    domains and the adjacency tables are flat lists indexed by it, so read a
+    cell as grid[r * size + c] (or the whole board as rows via grid_rows()).
+    The constructor still takes the grid as rows and inequalities as
+    ((r1, c1), (r2, c2), op) tuples.
+    """
+
     def __init__(self, size, initial_grid=None, inequality_constraints=None):
         self.size = size
-        self.grid = initial_grid if initial_grid else [[0 for _ in range(size)] for _ in range(size)]
-        self.domains = {}
-        for r in range(size):
-            for c in range(size):
-                if self.grid[r][c] == 0:
-                    self.domains[(r, c)] = set(range(1, size + 1))
-                else:
-                    self.domains[(r, c)] = {self.grid[r][c]}
+        self.num_cells = size * size
+        self.row_of = [idx // size for idx in range(self.num_cells)]
+        self.col_of = [idx % size for idx in range(self.num_cells)]
+        if initial_grid:
+            self.grid = [value for row in initial_grid for value in row]
+        else:
+            self.grid = [0] * self.num_cells
+
+        # Domains are int bitmasks: bit v is set iff value v is still possible.
+        self.full_mask = ((1 << (size + 1)) - 1) & ~1
+        # less_mask[v] holds every value < v, greater_mask[v] every value > v.
+        self.less_mask = [((1 << v) - 1) & ~1 for v in range(size + 1)]
+        self.greater_mask = [self.full_mask & ~((1 << (v + 1)) - 1) for v in range(size + 1)]
+
+        self.domains = [self.full_mask if value == 0 else 1 << value for value in self.grid]
+        # row_used[r] / col_used[c] hold the bits of the values already placed in
+        # that row / column, so all-different checks are a single AND per axis.
+        self.row_used = [0] * size
+        self.col_used = [0] * size
+        for idx, value in enumerate(self.grid):
+            if value != 0:
+                self.row_used[self.row_of[idx]] |= 1 << value
+                self.col_used[self.col_of[idx]] |= 1 << value
+
+        # domain_sizes[var] caches the popcount of each domain; size_buckets[k]
+        # holds the unassigned cells whose domain currently has k values (for MRV).
+        # Both stay None until track_domain_sizes() is called.
+        self.domain_sizes = None
+        self.size_buckets = None
 
         self.inequality_constraints = inequality_constraints if inequality_constraints else []
+        self._build_adjacency()
         self._prune_initial_domains()
 
+    def cell_index(self, r, c):
+        """Returns the integer index of cell (r, c)."""
+        return r * self.size + c
+
+    def cell_coords(self, var):
+        """Returns the (r, c) position of cell index 'var'."""
+        return self.row_of[var], self.col_of[var]
+
+    def grid_rows(self):
+        """Returns the grid as a list of rows."""
+        return [self.grid[r * self.size:(r + 1) * self.size] for r in range(self.size)]
+
+    def track_domain_sizes(self):
+        """Builds domain_sizes / size_buckets and keeps them up to date from now on."""
+        self.domain_sizes = [mask.bit_count() for mask in self.domains]
+        self.size_buckets = [set() for _ in range(self.size + 1)]
+        for var, value in enumerate(self.grid):
+            if value == 0:
+                self.size_buckets[self.domain_sizes[var]].add(var)
+
+    def _build_adjacency(self):
+        """
+        Precomputes the constraint graph once so lookups in the search are O(1):
+        row/column cells, inequality partners per cell (normalized so the entry
+        (other, op) reads "cell op other"), the same relation as a per-cell
+        {other: op} dict, and the full neighbor tuple of every cell.
+        """
+        size = self.size
+        self.row_cells = [tuple(range(r * size, (r + 1) * size)) for r in range(size)]
+        self.col_cells = [tuple(range(c, self.num_cells, size)) for c in range(size)]
+
+        self.ineq_by_cell = [[] for _ in range(self.num_cells)]
+        self.ineq_between = [{} for _ in range(self.num_cells)]
+        for (r1, c1), (r2, c2), op in self.inequality_constraints:
+            v1 = self.cell_index(r1, c1)
+            v2 = self.cell_index(r2, c2)
+            flipped = '<' if op == '>' else '>'
+            self.ineq_by_cell[v1].append((v2, op))
+            self.ineq_by_cell[v2].append((v1, flipped))
+            self.ineq_between[v1].setdefault(v2, op)
+            self.ineq_between[v2].setdefault(v1, flipped)
+
+        self.neighbors = []
+        for var in range(self.num_cells):
+            r, c = self.row_of[var], self.col_of[var]
+            neighbors = [cell for cell in self.row_cells[r] if cell != var]
+            neighbors += [cell for cell in self.col_cells[c] if cell != var]
+            for other, _ in self.ineq_by_cell[var]:
+                if self.row_of[other] != r and self.col_of[other] != c and other not in neighbors:
+                    neighbors.append(other)
+            self.neighbors.append(tuple(neighbors))
+
     def _prune_initial_domains(self):
         """Prune domains based on initial fixed values."""
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.grid[r][c] != 0:
-                    self._enforce_all_different_constraints((r, c), self.grid[r][c])
+        for var, value in enumerate(self.grid):
+            if value != 0:
+                self._enforce_all_different_constraints(var, value)
+
+    def set_domain(self, var, new_mask, trail=None):
+        """
+        Replaces the domain of 'var', recording the previous mask on 'trail'
+        (a list of (var, old_mask) entries) so the change can be undone.
+        """
+        if trail is not None:
+            trail.append((var, self.domains[var]))
+        self._write_domain(var, new_mask)
+
+    def undo(self, trail, mark):
+        """Pops 'trail' back down to 'mark', restoring every recorded domain."""
+        while len(trail) > mark:
+            var, old_mask = trail.pop()
+            self._write_domain(var, old_mask)
+
+    def _write_domain(self, var, mask):
+        """Stores a domain and keeps domain_sizes / size_buckets (if tracked) in step with it."""
+        self.domains[var] = mask
+        if self.size_buckets is None:
+            return
+        new_size = mask.bit_count()
+        old_size = self.domain_sizes[var]
+        if new_size != old_size:
+            self.domain_sizes[var] = new_size
+            if self.grid[var] == 0:
+                self.size_buckets[old_size].discard(var)
+                self.size_buckets[new_size].add(var)
 
-    def assign(self, var, value):
+    def assign(self, var, value, trail=None):
         """Assigns a value to a variable and updates its domain."""
-        r, c = var
-        self.grid[r][c] = value
-        self.domains[var] = {value}
+        if self.size_buckets is not None:
+            self.size_buckets[self.domain_sizes[var]].discard(var)
+        self.grid[var] = value
+        self.row_used[self.row_of[var]] |= 1 << value
+        self.col_used[self.col_of[var]] |= 1 << value
+        self.set_domain(var, 1 << value, trail)
 
     def unassign(self, var):
         """Unassigns a variable and restores its initial domain."""
-        r, c = var
-        self.grid[r][c] = 0
+        keep = ~(1 << self.grid[var])
+        self.row_used[self.row_of[var]] &= keep
+        self.col_used[self.col_of[var]] &= keep
+        self.grid[var] = 0
+        if self.size_buckets is not None:
+            self.size_buckets[self.domain_sizes[var]].add(var)
         # Re-initialize domain for unassigned variable
-        self.domains[var] = set(range(1, self.size + 1))
+        self._write_domain(var, self.full_mask)
         # Note: For backtracking, actual domain restoration after inference will be handled by the CSP solver.
         # This unassign only resets the grid value and initial domain set for consistency.
 
     def get_unassigned_variables(self):
         """Returns a list of unassigned variables."""
-        unassigned = []
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.grid[r][c] == 0:
-                    unassigned.append((r, c))
-        return unassigned
+        return [var for var, value in enumerate(self.grid) if value == 0]
 
     def is_consistent(self, var, value):
-        """Checks if assigning 'value' to 'var' is consistent with all constraints."""
-        r, c = var
+        """
+        Checks if assigning 'value' to the (still unassigned) 'var' is consistent
+        with all constraints.
+        """
+        # All-Different constraint for row and column
+        if (self.row_used[self.row_of[var]] | self.col_used[self.col_of[var]]) & (1 << value):
+            return False
 
-        # All-Different constraint for row
-        for col in range(self.size):
-            if col != c and self.grid[r][col] == value:
-                return False
+        # Inequality constraints touching this cell ("var op other")
+        for other, op in self.ineq_by_cell[var]:
+            other_value = self.grid[other]
+            if other_value != 0:
+                if op == '<' and not (value < other_value):
+                    return False
+                if op == '>' and not (value > other_value):
+                    return False
+        return True
+
+    def neighbor_prunings(self, var, value):
+        """
+        Single pass over the neighbors of 'var' for the value 'value': checks the
+        inequality constraints against assigned neighbors and computes the pruned
+        domain of every unassigned one (All-Different on the same row/column plus
+        the less/greater masks for inequalities).
+        Returns the list of (neighbor, new_mask) for domains that would shrink, or
+        None if the value is inconsistent or would empty a neighbor's domain.
+        Nothing is written to the board.
+        """
+        r, c = self.row_of[var], self.col_of[var]
+        other_values = ~(1 << value)
+        greater_values = self.greater_mask[value]
+        less_values = self.less_mask[value]
+        var_ineqs = self.ineq_between[var]
+        grid = self.grid
+        domains = self.domains
+
+        prunings = []
+        for neighbor in self.neighbors[var]:
+            op = var_ineqs.get(neighbor) if var_ineqs else None  # "var op neighbor"
+            neighbor_value = grid[neighbor]
+            if neighbor_value != 0:
+                if op == '<' and not (value < neighbor_value):
+                    return None
+                if op == '>' and not (value > neighbor_value):
+                    return None
+                continue
+
+            old_mask = domains[neighbor]
+            mask = old_mask
+            if self.row_of[neighbor] == r or self.col_of[neighbor] == c:
+                mask &= other_values
+            if op == '<':  # neighbor must be greater than value
+                mask &= greater_values
+            elif op == '>':  # neighbor must be less than value
+                mask &= less_values
+
+            if mask != old_mask:
+                if mask == 0:
+                    return None
+                prunings.append((neighbor, mask))
+        return prunings
+
+    def assign_and_propagate(self, var, value, trail):
+        """
+        Assigns 'value' to the unassigned 'var' and forward-checks it in one pass:
+        consistency with the placed values, pruning of the neighbors' domains and
+        the domain-size bookkeeping all happen together, recorded on 'trail'.
+        Returns False (board untouched) if the value is inconsistent or would empty
+        a neighbor's domain, otherwise the list of neighbors whose domains shrank.
+        """
+        if (self.row_used[self.row_of[var]] | self.col_used[self.col_of[var]]) & (1 << value):
+            return False
+        prunings = self.neighbor_prunings(var, value)
+        if prunings is None:
+            return False
+
+        self.assign(var, value, trail)
+        for neighbor, mask in prunings:
+            self.set_domain(neighbor, mask, trail)
+        return [neighbor for neighbor, _ in prunings]
 
-        # All-Different constraint for column
-        for row in range(self.size):
-            if row != r and self.grid[row][c] == value:
+    def givens_consistent(self):
+        """
+        Checks that the fixed cells of the initial grid do not violate each other
+        and that no cell pair carries contradicting inequalities.
+        """
+        for line in self.row_cells + self.col_cells:
+            values = [self.grid[var] for var in line if self.grid[var] != 0]
+            if len(values) != len(set(values)):
                 return False
 
-        # Inequality constraints
         for (r1, c1), (r2, c2), op in self.inequality_constraints:
-            val1 = self.grid[r1][c1]
-            val2 = self.grid[r2][c2]
-
-            # If the current assignment completes an inequality constraint
-            if (r1, c1) == var and val2 != 0:
-                if op == '<' and not (value < val2):
-                    return False
-                if op == '>' and not (value > val2):
-                    return False
-            elif (r2, c2) == var and val1 != 0:
-                if op == '<' and not (val1 < value):
-                    return False
-                if op == '>' and not (val1 > value):
-                    return False
-            # If both are assigned (and not the current var), check existing consistency
-            elif val1 != 0 and val2 != 0 and ((r1,c1) != var and (r2,c2) != var):
+            val1 = self.grid[self.cell_index(r1, c1)]
+            val2 = self.grid[self.cell_index(r2, c2)]
+            if val1 != 0 and val2 != 0:
                 if op == '<' and not (val1 < val2):
                     return False
                 if op == '>' and not (val1 > val2):
                     return False
+
+        # ineq_between keeps only the first relation given for a cell pair, so a
+        # pair constrained both ways (or a cell constrained against itself) has
+        # no solution and is rejected here.
+        for var in range(self.num_cells):
+            for other, op in self.ineq_by_cell[var]:
+                if self.ineq_between[var][other] != op:
+                    return False
         return True
 
-    def _enforce_all_different_constraints(self, fixed_var, fixed_value):
+    def _enforce_all_different_constraints(self, fixed_var, fixed_value, trail=None):
         """
         Helper to prune domains of other cells in the same row/column
         when a cell is initially fixed.
         """
-        r, c = fixed_var
-        for col in range(self.size):
-            if col != c and fixed_value in self.domains.get((r, col), set()):
-                self.domains[(r, col)].discard(fixed_value)
-        for row in range(self.size):
-            if row != r and fixed_value in self.domains.get((row, c), set()):
-                self.domains[(row, c)].discard(fixed_value)
-
+        bit = 1 << fixed_value
+        for line in (self.row_cells[self.row_of[fixed_var]], self.col_cells[self.col_of[fixed_var]]):
+            for var in line:
+                if var != fixed_var and self.domains[var] & bit:
+                    self.set_domain(var, self.domains[var] & ~bit, trail)
 
     def get_neighbors(self, var):
         """Returns neighboring variables based on all-different and inequality constraints."""
-        r, c = var
-        neighbors = set()
-
-        # All-Different neighbors (row and column)
-        for col in range(self.size):
-            if col != c:
-                neighbors.add((r, col))
-        for row in range(self.size):
-            if row != r:
-                neighbors.add((row, c))
-
-        # Inequality neighbors
-        for (r1, c1), (r2, c2), _ in self.inequality_constraints:
-            if (r1, c1) == var:
-                neighbors.add((r2, c2))
-            elif (r2, c2) == var:
-                neighbors.add((r1, c1))
-        return list(neighbors)
+        return self.neighbors[var]
 
     def display(self):
         """Prints the current state of the board."""
-        for r in range(self.size):
+        for r, row in enumerate(self.grid_rows()):
             row_str = ""
             for c in range(self.size):
-                row_str += str(self.grid[r][c] if self.grid[r][c] != 0 else '_') + " "
+                value = row[c]
+                row_str += str(value if value != 0 else '_') + " "
                 if c < self.size - 1:
                     # Check for horizontal inequality
                     for (r1,c1),(r2,c2),op in self.inequality_constraints:
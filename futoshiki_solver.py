@@ -1,8 +1,13 @@
 from futoshiki_board import FutoshikiBoard
 from csp_solver import CSPSolver
-import copy
 import time
-import matplotlib.pyplot as plt  # Import matplotlib
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')  # Headless backend: the plot is written to a file, no GUI windows
+    import matplotlib.pyplot as plt
+except ImportError:  # Plotting is optional, e.g. on headless benchmark machines
+    plt = None
 
 
 # No longer needed:
@@ -15,11 +20,12 @@ def run_solver(board_config, solver_type="optimized"):
     """
     size, initial_grid, inequality_constraints = board_config
 
-    # Create a deep copy of the initial grid and constraints for each solver run
-    # to ensure they start from the same fresh state.
+    # FutoshikiBoard copies the grid into its own flat list and never mutates the
+    # constraint list, so every solver run starts from the same fresh state without
+    # copying the inputs here.
     board_copy = FutoshikiBoard(size,
-                                initial_grid=copy.deepcopy(initial_grid),
-                                inequality_constraints=copy.deepcopy(inequality_constraints))
+                                initial_grid=initial_grid,
+                                inequality_constraints=inequality_constraints)
 
     print(f"\n--- Running {solver_type.upper()} Solver ---")
     print("Initial Board:")
@@ -28,9 +34,12 @@ def run_solver(board_config, solver_type="optimized"):
     if solver_type == "simple":
         solver = CSPSolver(board_copy)
     elif solver_type == "optimized":
-        solver = CSPSolver(board_copy, use_forward_checking=True, use_ac2=True, use_mrv=True, use_lcv=True)
+        solver = CSPSolver(board_copy, use_forward_checking=True, use_ac3=True, use_mrv=True, use_lcv=True)
+    elif solver_type == "parallel":
+        solver = CSPSolver(board_copy, use_forward_checking=True, use_ac3=True, use_mrv=True, use_lcv=True,
+                           use_parallel=True)
     else:
-        raise ValueError("Invalid solver type. Choose 'simple' or 'optimized'.")
+        raise ValueError("Invalid solver type. Choose 'simple', 'optimized' or 'parallel'.")
 
     solution_found = solver.solve()
 
@@ -44,10 +53,9 @@ def run_solver(board_config, solver_type="optimized"):
     return solver.backtracks, (time.time() - solver.start_time)
 
 
-# در تابع plot_results
-def plot_results(puzzle_name, results):
+def _plot_puzzle(ax1, ax2, puzzle_name, results):
     """
-    Plots the comparison results for a given puzzle.
+    Draws the comparison results for a given puzzle on a pair of axes.
     """
     labels = ['Simple', 'Optimized']
     times = [results['simple']['time'], results['optimized']['time']]
@@ -55,34 +63,44 @@ def plot_results(puzzle_name, results):
 
     x = range(len(labels))
 
-    # تغییر figsize به (14, 6) یا حتی بزرگتر
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-    fig.suptitle(f'Performance Comparison for {puzzle_name}', fontsize=14) # می توانید fontsize را برای عنوان اصلی هم تنظیم کنید
-
     # Plot for Time
     ax1.bar(x, times, color=['skyblue', 'lightcoral'])
     ax1.set_ylabel('Time (seconds)')
-    ax1.set_title('Solving Time')
+    ax1.set_title(f'Solving Time - {puzzle_name}')
     ax1.set_xticks(x)
     ax1.set_xticklabels(labels)
     for i, v in enumerate(times):
-        ax1.text(i, v + 0.01, f'{v:.4f}', ha='center', va='bottom', fontsize=9) # fontsize را کمی کاهش دهید
+        ax1.text(i, v + 0.01, f'{v:.4f}', ha='center', va='bottom', fontsize=9)
 
     # Plot for Backtracks
     ax2.bar(x, backtracks, color=['lightgreen', 'salmon'])
     ax2.set_ylabel('Number of Backtracks')
-    ax2.set_title('Total Backtracks')
+    ax2.set_title(f'Total Backtracks - {puzzle_name}')
     ax2.set_xticks(x)
     ax2.set_xticklabels(labels)
     for i, v in enumerate(backtracks):
-        ax2.text(i, v + 0.01, f'{int(v)}', ha='center', va='bottom', fontsize=9) # fontsize را کمی کاهش دهید
+        ax2.text(i, v + 0.01, f'{int(v)}', ha='center', va='bottom', fontsize=9)
+
+
+def plot_all(results_data, path='results.png'):
+    """
+    Plots the comparison results of every puzzle into a single figure, one row
+    per puzzle, and writes it to 'path'.
+    """
+    if plt is None:
+        print("\nmatplotlib is not installed; skipping the results plot.")
+        return
+
+    fig, axes = plt.subplots(len(results_data), 2, figsize=(14, 6 * len(results_data)), squeeze=False)
+    fig.suptitle('Performance Comparison', fontsize=14)
+    for (ax1, ax2), (puzzle_name, results) in zip(axes, results_data.items()):
+        _plot_puzzle(ax1, ax2, puzzle_name, results)
 
-    # حذف پارامتر rect یا تنظیم دقیق‌تر آن در صورت نیاز
-    plt.tight_layout()
-    # اگر هنوز هم عنوان اصلی همپوشانی دارد، می توانید از این استفاده کنید:
-    # plt.tight_layout(rect=[0, 0, 1, 0.95]) # اگر عنوان کلی بالا باشد، 0.95 می تواند مناسب باشد
+    plt.tight_layout(rect=[0, 0, 1, 0.97])
+    fig.savefig(path, dpi=90)
+    plt.close(fig)
+    print(f"\nResults plot written to {path}")
 
-    plt.show()
 
 if __name__ == "__main__":
     # Define a sample Futoshiki puzzle (e.g., the one from your image)
@@ -180,5 +198,5 @@ if __name__ == "__main__":
         else:
             print("Both solvers performed the same number of backtracks.")
 
-        # Plot the results for the current puzzle
-        plot_results(puzzle_name, res)
\ No newline at end of file
+    # Plot all puzzles at once, after every solve has finished
+    plot_all(results_data)
@@ -1,67 +1,115 @@
+from array import array
 from collections import deque
+from futoshiki_board import iter_bits
+from inference_numba import ac3_numba
+from specialize import line_scans
 
+try:
+    import _propagate  # Optional Cython extension, built with setup.py
+except ImportError:
+    _propagate = None
 
-def forward_check(csp, var, value):
+CYTHON_AVAILABLE = _propagate is not None
+
+
+def forward_check(csp, var, pruned):
     """
-    Performs forward checking after assigning 'value' to 'var'.
-    Removes inconsistent values from the domains of unassigned neighboring variables.
+    Completes forward checking for an assignment to 'var' made by
+    FutoshikiBoard.assign_and_propagate, which already pruned the direct neighbors
+    ('pruned' lists the cells whose domains shrank). Cascades the consequences:
+    a cell left with a single value (naked single) is propagated as if assigned,
+    and a value that fits only one cell of a row/column (hidden single) is forced there.
     Returns True if consistent, False if any domain becomes empty.
+    Every pruned domain is recorded on csp.trail so the caller can undo it.
     """
-    r_var, c_var = var
-
-    # Temporarily update the domain for 'var' for consistency checks
-    original_domain = csp.board.domains[var]
-    csp.board.domains[var] = {value}
-
-    # Keep track of domain changes for backtracking
-    pruned_values = {}
-
-    for neighbor in csp.board.get_neighbors(var):
-        if csp.board.grid[neighbor[0]][neighbor[1]] == 0:  # Only check unassigned neighbors
-            r_neighbor, c_neighbor = neighbor
-            original_neighbor_domain = set(csp.board.domains[neighbor])
-
-            for val_n in list(csp.board.domains[neighbor]):  # Iterate over a copy as we modify
-                # Check consistency if 'val_n' is assigned to 'neighbor'
-                # and 'value' is assigned to 'var'.
-
-                # Check All-Different constraint
-                if val_n == value and (r_var == r_neighbor or c_var == c_neighbor):
-                    csp.board.domains[neighbor].discard(val_n)
-
-                # Check Inequality constraint
-                is_inequality_involved = False
-                for (v1, v2, op) in csp.board.inequality_constraints:
-                    if (v1 == var and v2 == neighbor) or (v2 == var and v1 == neighbor):
-                        is_inequality_involved = True
-
-                        if (v1 == var and v2 == neighbor):  # var < neighbor or var > neighbor
-                            if op == '<' and not (value < val_n):
-                                csp.board.domains[neighbor].discard(val_n)
-                            elif op == '>' and not (value > val_n):
-                                csp.board.domains[neighbor].discard(val_n)
-                        elif (v2 == var and v1 == neighbor):  # neighbor < var or neighbor > var
-                            if op == '<' and not (val_n < value):
-                                csp.board.domains[neighbor].discard(val_n)
-                            elif op == '>' and not (val_n > value):
-                                csp.board.domains[neighbor].discard(val_n)
-                        break  # Only one inequality per pair of cells
-
-            if not csp.board.domains[neighbor]:
-                # Restore domains if an inconsistency is found
-                csp.board.domains[var] = original_domain
-                for p_var, p_vals in pruned_values.items():
-                    csp.board.domains[p_var].update(p_vals)
+    board = csp.board
+    domains = board.domains
+    row_of = board.row_of
+    col_of = board.col_of
+    queue = []  # Cells whose single value still has to be propagated
+    forced = {var}
+    # The assigned cell lost its other values, so its own lines are dirty too
+    dirty_rows = {row_of[var]}
+    dirty_cols = {col_of[var]}
+
+    for cell in pruned:
+        dirty_rows.add(row_of[cell])
+        dirty_cols.add(col_of[cell])
+        mask = domains[cell]
+        # Naked single: the cell has only one value left
+        if mask & (mask - 1) == 0:
+            forced.add(cell)
+            queue.append(cell)
+
+    scan_row, scan_col = line_scans(board.size)
+    while True:
+        while queue:
+            cell = queue.pop()
+            prunings = board.neighbor_prunings(cell, domains[cell].bit_length() - 1)
+            if prunings is None:
                 return False  # Domain became empty, backtrack
 
-            pruned_values[neighbor] = original_neighbor_domain - csp.board.domains[neighbor]
-
-    # Restore the original domain for 'var' if it wasn't a fixed value (already handled by assign)
-    # The actual assignment in CSP is handled by `assign` method which changes the grid value
-    # and sets the domain. Here, we just deal with temporary domain updates for consistency checks.
-    csp.board.domains[var] = original_domain
-
-    return pruned_values  # Return pruned values for backtracking
+            for neighbor, mask in prunings:
+                board.set_domain(neighbor, mask, csp.trail)
+                dirty_rows.add(row_of[neighbor])
+                dirty_cols.add(col_of[neighbor])
+                if mask & (mask - 1) == 0 and neighbor not in forced:
+                    forced.add(neighbor)
+                    queue.append(neighbor)
+
+        if not dirty_rows and not dirty_cols:
+            return True
+
+        # Hidden singles in every row/column whose domains changed; narrowing a
+        # cell marks its row and column dirty again for the next round
+        rows, dirty_rows = dirty_rows, set()
+        cols, dirty_cols = dirty_cols, set()
+        for r in rows:
+            seen_once, seen_twice = scan_row(board.grid, domains, r * board.size)
+            if not _force_hidden_singles(csp, board.row_cells[r], board.row_used[r], seen_once, seen_twice,
+                                         forced, queue, dirty_rows, dirty_cols):
+                return False
+        for c in cols:
+            seen_once, seen_twice = scan_col(board.grid, domains, c)
+            if not _force_hidden_singles(csp, board.col_cells[c], board.col_used[c], seen_once, seen_twice,
+                                         forced, queue, dirty_rows, dirty_cols):
+                return False
+
+
+def _force_hidden_singles(csp, line, used, seen_once, seen_twice, forced, queue, dirty_rows, dirty_cols):
+    """
+    Forces every value that fits exactly one unassigned cell of 'line' (a row
+    or column) into that cell, queueing it for propagation and marking the
+    row and column of every narrowed cell in 'dirty_rows' / 'dirty_cols'.
+    'used' holds the values already placed in the line; 'seen_once' / 'seen_twice'
+    the values found in at least one / two of its unassigned cells.
+    Returns False if some value has no place left or one cell is forced twice.
+    """
+    board = csp.board
+
+    if board.full_mask & ~(seen_once | used):
+        return False  # Some value can no longer be placed in this line
+
+    hidden = seen_once & ~seen_twice & ~used
+    if not hidden:
+        return True
+
+    for cell in line:
+        if board.grid[cell] != 0:
+            continue
+        mask = board.domains[cell]
+        single = mask & hidden
+        if not single or mask == single and cell in forced:
+            continue
+        if single & (single - 1):
+            return False  # Two values can only go in this one cell
+        if mask != single:
+            board.set_domain(cell, single, csp.trail)
+            dirty_rows.add(board.row_of[cell])
+            dirty_cols.add(board.col_of[cell])
+        forced.add(cell)
+        queue.append(cell)
+    return True
 
 
 def revise(csp, xi, xj):
@@ -69,103 +117,86 @@ def revise(csp, xi, xj):
     Revises the domain of xi relative to xj.
     Returns True if the domain of xi was changed, False otherwise.
     """
-    revised = False
-    to_remove = set()
-
-    for x in csp.board.domains[xi]:
-        # Assume x is assigned to xi. Is there any value y in D(xj)
-        # such that the constraint between xi and xj is satisfied?
-        consistent_found = False
-        for y in csp.board.domains[xj]:
-            # Temporarily assign x to xi and y to xj for checking consistency
-            # This is a simplified check that only considers the binary constraint between xi and xj.
-            # For Futoshiki, we need to consider both all-different and inequality.
-
-            # Check All-Different (if same row/col)
-            if xi[0] == xj[0] or xi[1] == xj[1]:
-                if x == y:
-                    continue  # Not consistent
-
-            # Check Inequality
-            is_inequality = False
-            for (v1, v2, op) in csp.board.inequality_constraints:
-                if (v1 == xi and v2 == xj):  # xi < xj or xi > xj
-                    is_inequality = True
-                    if op == '<' and (x < y):
-                        consistent_found = True
-                        break
-                    elif op == '>' and (x > y):
-                        consistent_found = True
-                        break
-                elif (v1 == xj and v2 == xi):  # xj < xi or xj > xi
-                    is_inequality = True
-                    if op == '<' and (y < x):
-                        consistent_found = True
-                        break
-                    elif op == '>' and (y > x):
-                        consistent_found = True
-                        break
-
-            if not is_inequality and (xi[0] != xj[0] and xi[1] != xj[1]):
-                # If no inequality and not same row/col, any combination is fine (for binary check)
-                consistent_found = True
-
-            if is_inequality and consistent_found:  # Found a consistent y for x
-                break
-            elif not is_inequality and (xi[0] == xj[0] or xi[1] == xj[1]):  # All-Different case
-                if x != y:  # If they are different, and no inequality applies, it's consistent.
-                    consistent_found = True
-                    break
-            elif not is_inequality and not (xi[0] == xj[0] or xi[1] == xj[1]):  # No direct constraint
-                consistent_found = True
-                break
-
-        if not consistent_found:
-            to_remove.add(x)
-
-    if to_remove:
-        csp.board.domains[xi] = csp.board.domains[xi] - to_remove
-        revised = True
-    return revised
-
-
-def ac2(csp):
+    board = csp.board
+    op = board.ineq_between[xi].get(xj)  # "xi op xj", if any
+    same_line = board.row_of[xi] == board.row_of[xj] or board.col_of[xi] == board.col_of[xj]
+    domain_i = board.domains[xi]
+    domain_j = board.domains[xj]
+
+    # A value x of xi is kept if some y in D(xj) supports it; with bitmasks
+    # that is a single AND against the mask of allowed partners of x.
+    keep = 0
+    for x in iter_bits(domain_i):
+        if op == '<':  # needs some y > x
+            supported = domain_j & board.greater_mask[x]
+        elif op == '>':  # needs some y < x
+            supported = domain_j & board.less_mask[x]
+        elif same_line:  # All-Different: needs some y != x
+            supported = domain_j & ~(1 << x)
+        else:  # No direct constraint
+            supported = True
+        if supported:
+            keep |= 1 << x
+
+    if keep != domain_i:
+        board.set_domain(xi, keep, csp.trail)
+        return True
+    return False
+
+
+def ac3(csp):
     """
-    Implements the AC-2 arc consistency algorithm.
-    Propagates constraints throughout the CSP by repeatedly revising arcs.
+    Implements the AC-3 arc consistency algorithm.
+    The queue starts with every arc of the constraint graph; when D(xi) shrinks,
+    only the arcs (xk, xi) pointing back at it are re-queued.
     Returns True if arc consistency is achieved, False if any domain becomes empty.
+    Uses a compiled propagator when the solver has prepared its tables: the
+    Cython extension if it is built, otherwise the numba kernel.
     """
-    queue = deque()
-
-    # Initializing the queue with all binary constraints (arcs)
-    variables = [(r, c) for r in range(csp.board.size) for c in range(csp.board.size)]
-    for i in range(len(variables)):
-        xi = variables[i]
-        for j in range(i + 1, len(variables)):
-            xj = variables[j]
-
-            # Check if there's any direct constraint between xi and xj
-            # This includes All-Different (same row/col) and inequality constraints
-
-            is_constrained = False
-            if xi[0] == xj[0] or xi[1] == xj[1]:  # Same row or same column
-                is_constrained = True
-
-            for (v1, v2, op) in csp.board.inequality_constraints:
-                if (v1 == xi and v2 == xj) or (v1 == xj and v2 == xi):
-                    is_constrained = True
-                    break
-
-            if is_constrained:
-                queue.append((xi, xj))
-                queue.append((xj, xi))  # Add reverse arc as well
+    if csp.ac_tables is not None:
+        if CYTHON_AVAILABLE:
+            consistent, domains = _ac3_cython(csp.board.domains, csp.ac_tables)
+        else:
+            consistent, domains = ac3_numba(csp.board.domains, csp.ac_tables)
+        _write_back(csp, domains)
+        return consistent
+
+    # Arcs (xi, xj) are encoded as the single int xi * num_cells + xj
+    num_cells = csp.board.num_cells
+    neighbors = csp.board.neighbors
+    queue = deque(xi * num_cells + xj for xi in range(num_cells) for xj in neighbors[xi])
+    in_queue = set(queue)
 
     while queue:
-        xi, xj = queue.popleft()
+        arc = queue.popleft()
+        in_queue.discard(arc)
+        xi, xj = divmod(arc, num_cells)
         if revise(csp, xi, xj):
             if not csp.board.domains[xi]:
                 return False  # Domain empty, inconsistency detected
-            for xk in csp.board.get_neighbors(xi):  # For each neighbor xk of xi
-                if xk != xj:  # Except xj
-                    queue.append((xk, xi))  # Add (xk, xi) to the queue
-    return True
\ No newline at end of file
+            for xk in neighbors[xi]:  # For each neighbor xk of xi
+                next_arc = xk * num_cells + xi
+                if xk != xj and next_arc not in in_queue:  # Except xj
+                    queue.append(next_arc)
+                    in_queue.add(next_arc)
+    return True
+
+
+def _ac3_cython(domains, tables):
+    """
+    Runs the Cython AC-3 over a sequence of bitmask domains and the board's
+    ACTables. Returns (consistent, pruned domains).
+    """
+    domains = array('q', domains)
+    consistent = _propagate.ac3_propagate(domains, tables.neighbors_flat, tables.neighbors_offsets,
+                                          tables.ineq_table, tables.size)
+    return consistent, domains
+
+
+def _write_back(csp, domains):
+    """Stores every domain that differs from the board's, recording it on the trail."""
+    board = csp.board
+    for var, new_mask in enumerate(domains):
+        new_mask = int(new_mask)
+        if new_mask != board.domains[var]:
+            board.set_domain(var, new_mask, csp.trail)
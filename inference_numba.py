@@ -0,0 +1,126 @@
+"""
+Numba-compiled kernels for the arc-consistency inner loops.
+
+Cells are the board's linear indices r * N + c, domains are passed as a 1-D
+integer array of bitmasks and the constraint graph as the flat ACTables
+(ac_tables.py) built once per board. Numba is optional: if it cannot be
+imported NUMBA_AVAILABLE is False, the decorators below are no-ops and
+inference.py keeps using its pure Python propagation.
+"""
+from ac_tables import OP_LESS, OP_GREATER
+
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True, boundscheck=False)
+def _revise_kernel(domains, xi, xj, ineq_table, n):
+    """
+    Removes the values of domains[xi] that have no support in domains[xj].
+    Returns True if domains[xi] was changed.
+    """
+    ncells = n * n
+    op = ineq_table[xi * ncells + xj]
+    same_line = xi // n == xj // n or xi % n == xj % n
+    di = domains[xi]
+    dj = domains[xj]
+
+    keep = 0
+    for x in range(1, n + 1):
+        bit = 1 << x
+        if di & bit == 0:
+            continue
+        if op == OP_LESS:  # some y > x is needed
+            supported = dj & ~((bit << 1) - 1) != 0
+        elif op == OP_GREATER:  # some y < x is needed
+            supported = dj & (bit - 1) != 0
+        elif same_line:  # All-Different: some y != x is needed
+            supported = dj & ~bit != 0
+        else:
+            supported = True
+        if supported:
+            keep |= bit
+
+    if keep != di:
+        domains[xi] = keep
+        return True
+    return False
+
+
+@njit(cache=True, boundscheck=False)
+def _ac3_kernel(domains, queue, queue_len, in_queue, neighbors_flat, neighbors_offsets, ineq_table, n):
+    """
+    Runs arc consistency over 'domains' in place.
+
+    'queue' is a circular buffer of arc codes xi * N*N + xj whose first
+    'queue_len' entries are the initial arcs; 'in_queue' flags the arcs it
+    currently holds so every arc is queued at most once.
+    Returns False as soon as a domain becomes empty, True otherwise.
+    """
+    ncells = n * n
+    capacity = len(queue)
+    head = 0
+    size = queue_len
+
+    while size > 0:
+        arc = queue[head]
+        head = (head + 1) % capacity
+        size -= 1
+        in_queue[arc] = 0
+
+        xi = arc // ncells
+        xj = arc % ncells
+        if _revise_kernel(domains, xi, xj, ineq_table, n):
+            if domains[xi] == 0:
+                return False
+            for k in range(neighbors_offsets[xi], neighbors_offsets[xi + 1]):
+                xk = neighbors_flat[k]
+                if xk != xj:
+                    next_arc = xk * ncells + xi
+                    if in_queue[next_arc] == 0:
+                        in_queue[next_arc] = 1
+                        queue[(head + size) % capacity] = next_arc
+                        size += 1
+    return True
+
+
+def ac3_numba(domains, tables):
+    """
+    Numba-backed equivalent of inference.ac3 over a sequence of bitmask
+    domains and the board's ACTables. Returns (consistent, pruned domains).
+    """
+    ncells = tables.size * tables.size
+    domains = np.array(domains, dtype=np.int64)
+    queue = np.zeros(ncells * ncells, dtype=np.int64)
+    queue_len = len(tables.initial_arcs)
+    queue[:queue_len] = tables.initial_arcs
+    in_queue = np.zeros(ncells * ncells, dtype=np.uint8)
+    in_queue[tables.initial_arcs] = 1
+
+    consistent = _ac3_kernel(domains, queue, queue_len, in_queue, tables.neighbors_flat,
+                             tables.neighbors_offsets, tables.ineq_table, tables.size)
+    return consistent, domains
+
+
+def warmup():
+    """Compiles (or loads from cache) the kernels on a tiny problem."""
+    n = 2
+    ncells = n * n
+    domains = np.array([6, 6, 6, 6], dtype=np.int64)
+    neighbors_flat = np.array([1, 2, 0, 3, 0, 3, 1, 2], dtype=np.int64)
+    neighbors_offsets = np.array([0, 2, 4, 6, 8], dtype=np.int64)
+    ineq_table = np.zeros(ncells * ncells, dtype=np.int8)
+    queue = np.zeros(ncells * ncells, dtype=np.int64)
+    in_queue = np.zeros(ncells * ncells, dtype=np.uint8)
+    _ac3_kernel(domains, queue, 0, in_queue, neighbors_flat, neighbors_offsets, ineq_table, n)
+    _revise_kernel(domains, 0, 1, ineq_table, n)
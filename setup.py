@@ -0,0 +1,27 @@
+from setuptools import setup
+
+# Builds the optional _propagate extension when Cython is installed; the solver
+# runs without it, so without Cython only the Python modules are installed.
+#   python setup.py build_ext --inplace
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize("_propagate.pyx")
+
+setup(
+    name="futoshiki-solver",
+    python_requires=">=3.10",  # int.bit_count
+    py_modules=[
+        "ac_tables",
+        "csp_solver",
+        "futoshiki_board",
+        "futoshiki_solver",
+        "heuristics",
+        "inference",
+        "inference_numba",
+        "specialize",
+    ],
+    ext_modules=ext_modules,
+)
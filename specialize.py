@@ -0,0 +1,47 @@
+"""
+Size-specialized versions of the row/column scans used by the inference code.
+
+The board size is fixed for a whole solve, so instead of looping over
+range(size) the scans are generated as straight-line code with the cell
+offsets baked in as constants, compiled once per size and cached.
+"""
+
+_SPECIALIZED = {}
+
+
+def _line_scan_source(name, offsets):
+    """
+    Builds the source of a scan over the cells base + offset for each offset.
+    The generated function returns (seen_once, seen_twice): the values present in
+    at least one / at least two unassigned cells of the line.
+    """
+    lines = [
+        f"def {name}(grid, domains, base):",
+        "    seen_once = 0",
+        "    seen_twice = 0",
+    ]
+    for offset in offsets:
+        cell = f"base + {offset}" if offset else "base"
+        lines += [
+            f"    if grid[{cell}] == 0:",
+            f"        mask = domains[{cell}]",
+            "        seen_twice |= seen_once & mask",
+            "        seen_once |= mask",
+        ]
+    lines.append("    return seen_once, seen_twice")
+    return "\n".join(lines) + "\n"
+
+
+def line_scans(size):
+    """
+    Returns (scan_row, scan_col) specialized for boards of 'size'.
+    scan_row(grid, domains, r * size) scans row r, scan_col(grid, domains, c)
+    scans column c.
+    """
+    if size not in _SPECIALIZED:
+        namespace = {}
+        source = (_line_scan_source(f"scan_row_{size}", range(size)) + "\n" +
+                  _line_scan_source(f"scan_col_{size}", range(0, size * size, size)))
+        exec(compile(source, f"<specialized line scans for size {size}>", "exec"), namespace)
+        _SPECIALIZED[size] = (namespace[f"scan_row_{size}"], namespace[f"scan_col_{size}"])
+    return _SPECIALIZED[size]
@@ -0,0 +1,256 @@
+import contextlib
+import io
+import itertools
+import os
+import random
+import unittest
+
+from futoshiki_board import FutoshikiBoard
+from csp_solver import CSPSolver
+from inference import CYTHON_AVAILABLE, _ac3_cython, ac3
+from inference_numba import NUMBA_AVAILABLE, _ac3_kernel, ac3_numba
+from ac_tables import ACTables
+
+
+def solve(size, initial_grid, inequality_constraints, **options):
+    """Runs CSPSolver quietly on a copy of the puzzle; returns (solution_found, board)."""
+    board = FutoshikiBoard(size, initial_grid=[list(row) for row in initial_grid],
+                           inequality_constraints=list(inequality_constraints))
+    solver = CSPSolver(board, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution_found = solver.solve()
+    return solution_found, board
+
+
+def is_solution(rows, size, initial_grid, inequality_constraints):
+    """Checks a grid (as rows) against the givens and every constraint."""
+    values = list(range(1, size + 1))
+    for r in range(size):
+        if sorted(rows[r]) != values or sorted(row[r] for row in rows) != values:
+            return False
+        for c in range(size):
+            if initial_grid[r][c] and initial_grid[r][c] != rows[r][c]:
+                return False
+    for (r1, c1), (r2, c2), op in inequality_constraints:
+        val1, val2 = rows[r1][c1], rows[r2][c2]
+        if op == '<' and not (val1 < val2):
+            return False
+        if op == '>' and not (val1 > val2):
+            return False
+    return True
+
+
+def latin_squares(size):
+    """Yields every size x size Latin square as a list of rows."""
+    rows = list(itertools.permutations(range(1, size + 1)))
+
+    def extend(square):
+        if len(square) == size:
+            yield square
+            return
+        for row in rows:
+            if all(row[c] != above[c] for above in square for c in range(size)):
+                yield from extend(square + [row])
+
+    yield from extend([])
+
+
+def random_puzzle(size, rng):
+    """Random givens and inequalities, not necessarily satisfiable."""
+    initial_grid = [[rng.randint(1, size) if rng.random() < 0.15 else 0 for _ in range(size)]
+                    for _ in range(size)]
+    inequalities = []
+    for _ in range(rng.randint(0, 2 * size)):
+        r, c = rng.randrange(size), rng.randrange(size - 1)
+        pair = [(r, c), (r, c + 1)] if rng.random() < 0.5 else [(c, r), (c + 1, r)]
+        rng.shuffle(pair)
+        inequalities.append((pair[0], pair[1], rng.choice('<>')))
+    return initial_grid, inequalities
+
+
+def random_ac_problem(rng):
+    """Random puzzle constraints plus a random non-empty domain for every empty cell."""
+    size = rng.randint(3, 6)
+    initial_grid, inequalities = random_puzzle(size, rng)
+    masks = [sum(1 << v for v in range(1, size + 1) if rng.random() < 0.9) or 1 << rng.randint(1, size)
+             for _ in range(size * size)]
+    return size, initial_grid, inequalities, masks
+
+
+def ac_board(problem):
+    """Builds a fresh board for a random_ac_problem."""
+    size, initial_grid, inequalities, masks = problem
+    board = FutoshikiBoard(size, initial_grid=initial_grid, inequality_constraints=inequalities)
+    for var in board.get_unassigned_variables():
+        board.set_domain(var, masks[var])
+    return board
+
+
+def python_ac3(board):
+    """Runs the pure-Python inference.ac3 on 'board'; returns its verdict."""
+    solver = CSPSolver(board)  # No use_ac3, so no compiled tables
+    return ac3(solver)
+
+
+SOLVER_OPTIONS = {
+    "simple": {},
+    "fc": dict(use_forward_checking=True),
+    "mrv": dict(use_mrv=True),
+    "lcv": dict(use_lcv=True),
+    "ac3": dict(use_ac3=True),
+    "mrv_lcv_fc": dict(use_forward_checking=True, use_mrv=True, use_lcv=True),
+    "optimized": dict(use_forward_checking=True, use_ac3=True, use_mrv=True, use_lcv=True),
+}
+
+
+class BruteForceComparisonTest(unittest.TestCase):
+    def test_agrees_with_exhaustive_search(self):
+        rng = random.Random(7)
+        squares = {size: list(latin_squares(size)) for size in (3, 4)}
+        for _ in range(200):
+            size = rng.choice((3, 4))
+            initial_grid, inequalities = random_puzzle(size, rng)
+            solvable = any(is_solution(square, size, initial_grid, inequalities) for square in squares[size])
+            for name, options in SOLVER_OPTIONS.items():
+                with self.subTest(solver=name, grid=initial_grid, inequalities=inequalities):
+                    solution_found, board = solve(size, initial_grid, inequalities, **options)
+                    self.assertEqual(solution_found, solvable)
+                    if solution_found:
+                        self.assertTrue(is_solution(board.grid_rows(), size, initial_grid, inequalities))
+
+    def test_contradicting_constraints_on_one_pair(self):
+        inequalities = [((0, 0), (0, 1), '<'), ((0, 1), (0, 0), '<')]
+        for name, options in SOLVER_OPTIONS.items():
+            with self.subTest(solver=name):
+                solution_found, _ = solve(3, [[0] * 3 for _ in range(3)], inequalities, **options)
+                self.assertFalse(solution_found)
+
+
+class ForwardCheckingFixpointTest(unittest.TestCase):
+    def test_no_hidden_single_left_after_inference(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            size = rng.randint(4, 6)
+            initial_grid, inequalities = random_puzzle(size, rng)
+            board = FutoshikiBoard(size, initial_grid=initial_grid, inequality_constraints=inequalities)
+            solver = CSPSolver(board, use_forward_checking=True)
+            for _ in range(3):
+                unassigned = board.get_unassigned_variables()
+                if not unassigned:
+                    break
+                var = rng.choice(unassigned)
+                values = [v for v in range(1, size + 1) if board.domains[var] >> v & 1]
+                mark = len(solver.trail)
+                if not values or not solver._assign_and_infer(var, rng.choice(values)):
+                    break
+                # Every row/column in which a domain changed must be at the fixpoint
+                changed = {cell for cell, _ in solver.trail[mark:]}
+                rows = {board.row_of[cell] for cell in changed}
+                cols = {board.col_of[cell] for cell in changed}
+                lines = [(board.row_cells[r], board.row_used[r]) for r in rows]
+                lines += [(board.col_cells[c], board.col_used[c]) for c in cols]
+                for line, used in lines:
+                    for v in range(1, size + 1):
+                        if used >> v & 1:
+                            continue
+                        cells = [cell for cell in line if board.grid[cell] == 0 and board.domains[cell] >> v & 1]
+                        self.assertTrue(cells)
+                        if len(cells) == 1:
+                            self.assertEqual(board.domains[cells[0]], 1 << v)
+
+
+class NumbaKernelTest(unittest.TestCase):
+    @unittest.skipIf(NUMBA_AVAILABLE, "the kernel is compiled when numba is installed")
+    def test_kernel_as_plain_python_matches_ac3(self):
+        rng = random.Random(11)
+        for _ in range(300):
+            board = ac_board(random_ac_problem(rng))
+            tables = ACTables(board)
+            ncells = board.num_cells
+            domains = list(board.domains)
+            queue = list(tables.initial_arcs) + [0] * (ncells * ncells - len(tables.initial_arcs))
+            in_queue = [0] * (ncells * ncells)
+            for arc in tables.initial_arcs:
+                in_queue[arc] = 1
+            consistent = _ac3_kernel(domains, queue, len(tables.initial_arcs), in_queue, tables.neighbors_flat,
+                                     tables.neighbors_offsets, tables.ineq_table, board.size)
+            self.assertEqual(consistent, python_ac3(board))
+            if consistent:
+                self.assertEqual(domains, board.domains)
+
+    @unittest.skipUnless(NUMBA_AVAILABLE, "numba is not installed")
+    def test_ac3_numba_matches_ac3(self):
+        rng = random.Random(13)
+        for _ in range(300):
+            board = ac_board(random_ac_problem(rng))
+            consistent, domains = ac3_numba(board.domains, ACTables(board))
+            self.assertEqual(consistent, python_ac3(board))
+            if consistent:
+                self.assertEqual([int(mask) for mask in domains], board.domains)
+
+
+class CythonPropagatorTest(unittest.TestCase):
+    @unittest.skipUnless(CYTHON_AVAILABLE, "the _propagate extension is not built")
+    def test_ac3_propagate_matches_ac3(self):
+        rng = random.Random(17)
+        for _ in range(300):
+            board = ac_board(random_ac_problem(rng))
+            consistent, domains = _ac3_cython(board.domains, ACTables(board))
+            self.assertEqual(consistent, python_ac3(board))
+            if consistent:
+                self.assertEqual(list(domains), board.domains)
+
+
+class LCVWithoutForwardCheckingTest(unittest.TestCase):
+    def test_row_and_column_masks_survive_value_ordering(self):
+        grid = [[3, 0, 0], [0, 0, 0], [1, 0, 0]]
+        solution_found, board = solve(3, grid, [], use_lcv=True)
+        self.assertTrue(solution_found)
+        self.assertTrue(is_solution(board.grid_rows(), 3, grid, []))
+
+
+class FailingBranchSolver(CSPSolver):
+    """Raises in every parallel branch."""
+
+    def _assign_and_infer(self, var, value):
+        raise ValueError("branch failed")
+
+
+class DyingBranchSolver(CSPSolver):
+    """Kills the worker process in every parallel branch."""
+
+    def _assign_and_infer(self, var, value):
+        os._exit(1)
+
+
+class ParallelSearchTest(unittest.TestCase):
+    def test_more_root_values_than_workers(self):
+        grid = [[0, 0, 0, 0, 0], [0, 0, 0, 0, 2], [0, 0, 0, 0, 0], [0, 0, 0, 5, 0], [0, 0, 0, 0, 0]]
+        inequalities = [((0, 2), (0, 1), '<'), ((4, 3), (3, 3), '<')]
+        for _ in range(20):
+            solution_found, board = solve(5, grid, inequalities, use_forward_checking=True, use_ac3=True,
+                                          use_mrv=True, use_lcv=True, use_parallel=True, workers=2)
+            self.assertTrue(solution_found)
+            self.assertTrue(is_solution(board.grid_rows(), 5, grid, inequalities))
+
+    def test_unsolvable_puzzle(self):
+        grid = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+        inequalities = [((0, 0), (0, 1), '<'), ((0, 1), (0, 2), '<'), ((1, 0), (0, 0), '<')]
+        solution_found, _ = solve(3, grid, inequalities, use_forward_checking=True, use_parallel=True, workers=2)
+        self.assertFalse(solution_found)
+
+    def test_worker_exception_is_raised(self):
+        solver = FailingBranchSolver(FutoshikiBoard(4), use_parallel=True, workers=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(RuntimeError, "branch failed"):
+                solver.solve()
+
+    def test_dead_worker_is_reported(self):
+        solver = DyingBranchSolver(FutoshikiBoard(4), use_parallel=True, workers=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(RuntimeError, "died"):
+                solver.solve()
+
+
+if __name__ == "__main__":
+    unittest.main()